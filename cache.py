@@ -0,0 +1,28 @@
+import hashlib
+import orjson
+import threading
+from cachetools import TTLCache
+
+
+class LLMCache:
+    """In-process TTL cache for LLM results, keyed by a hash of the request"""
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 3600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Hash the request parts into a cache key (dicts are key-order independent)"""
+        payload = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str)
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached value for key, or None"""
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key: str, value) -> None:
+        """Cache value under key"""
+        with self._lock:
+            self._cache[key] = value
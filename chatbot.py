@@ -1,10 +1,18 @@
 # from crewai import Agent, Task, Crew, LLM
 # from crewai_tools import TavilySearchTool
 # import logging
+# import re
 
 # # Configure logging
 # logger = logging.getLogger(__name__)
 
+# # Splits a lowercased message into word tokens
+# WORD_RE = re.compile(r"[a-z]+")
+
+# # Longest message (in words) that can get a canned identity/capability reply
+# # instead of going to the LLM
+# CANNED_MAX_WORDS = 5
+
 # class UpcyclingChatbot:
 #     def __init__(self):
 #         """Initialize the chatbot with LLM and response patterns"""
@@ -14,18 +22,42 @@
 #         )
         
 #         self.response_patterns = {
-#             'greetings': ['hi', 'hello', 'hey', 'hola'],
-#             'identity': ['name', 'who are you', 'what are you','what is waste2wonder'],
-#             'capabilities': ['can you do', 'help', 'what do you do', 'how can you help']
+#             'greetings': frozenset(['hi', 'hello', 'hey', 'hola']),
+#             'identity': frozenset(['name', 'who are you', 'what are you','what is waste2wonder']),
+#             'capabilities': frozenset(['can you do', 'help', 'what do you do', 'how can you help'])
 #         }
 
-#     def create_upcycling_crew(self, items):
-#         """Create a CrewAI setup for generating upcycling suggestions"""
-        
-#         # Research Agent
-#         research_agent = Agent(
+#         # Keywords that indicate upcycling intent
+#         self.upcycling_keywords = [
+#             'upcycling', 'upcycle', 'reuse', 'repurpose', 'make from', 'create with',
+#             'what can i do with', 'how to reuse', 'ideas for', 'craft from', 'tell me',
+#             'using', 'ideas', 'old', 'waste', 'recycle'
+#         ]
+
+#         # Material keywords that often indicate upcycling queries
+#         self.material_keywords = [
+#             'plastic', 'paper', 'bottle', 'box', 'container', 'cardboard',
+#             'glass', 'metal', 'wood', 'cloth', 'fabric', 'materials'
+#         ]
+
+#         # Precompile keyword lists into single-pass alternation patterns; both
+#         # the intent and material lists share one pattern so a single scan finds both
+#         self._query_re = re.compile(
+#             f"(?P<up>{self._keyword_pattern(self.upcycling_keywords)})"
+#             f"|(?P<mat>{self._keyword_pattern(self.material_keywords)})"
+#         )
+#         self._identity_re = re.compile(self._keyword_pattern(self.response_patterns['identity']))
+#         self._capabilities_re = re.compile(self._keyword_pattern(self.response_patterns['capabilities']))
+#         # Whole-word versions, used to decide whether a short message is only
+#         # asking who the bot is or what it can do
+#         self._identity_word_re = re.compile(rf"\b(?:{self._keyword_pattern(self.response_patterns['identity'])})\b")
+#         self._capabilities_word_re = re.compile(rf"\b(?:{self._keyword_pattern(self.response_patterns['capabilities'])})\b")
+
+#         # Agents don't depend on the user message, so build them once and
+#         # only create the per-request tasks in create_upcycling_crew
+#         self.research_agent = Agent(
 #             role="Upcycling Research Specialist",
-#             goal=f"Research creative and practical upcycling ideas specifically for: {items}. Focus on DIY-friendly, safe, and impactful projects.",
+#             goal="Research creative and practical upcycling ideas for the materials given in each task. Focus on DIY-friendly, safe, and impactful projects.",
 #             backstory="""You are an expert at finding creative and practical upcycling solutions. 
 #             You focus on projects that are feasible for home crafters and have meaningful environmental impact.
 #             You always consider safety and practicality in your suggestions.""",
@@ -34,8 +66,7 @@
 #             llm=self.llm
 #         )
 
-#         # Writer Agent
-#         writer_agent = Agent(
+#         self.writer_agent = Agent(
 #             role="Upcycling Idea Writer",
 #             goal="Create a detailed, step-by-step guide for the most practical and impactful upcycling idea",
 #             backstory="""You are a DIY expert who excels at explaining upcycling projects clearly.
@@ -45,11 +76,19 @@
 #             verbose=True
 #         )
 
+#     @staticmethod
+#     def _keyword_pattern(keywords):
+#         """Regex source matching any of the keywords as a substring"""
+#         return '|'.join(map(re.escape, sorted(keywords, key=len, reverse=True)))
+
+#     def create_upcycling_crew(self, items):
+#         """Create a CrewAI setup for generating upcycling suggestions"""
+        
 #         # Tasks
 #         task1 = Task(
 #             description=f"Find 3-5 recent or practical upcycling ideas for the materials: {items}. Focus on sustainability, feasibility, and creativity.",
 #             expected_output="A list of 3-5 potential upcycling ideas or inspirations",
-#             agent=research_agent
+#             agent=self.research_agent
 #         )
 
 #         task2 = Task(
@@ -58,61 +97,88 @@
 #                 "Include materials, steps, and safety tips. Format it neatly as a single actionable idea."
 #             ),
 #             expected_output="A single, actionable upcycling idea formatted with Materials, Steps, Safety Tips",
-#             agent=writer_agent,
+#             agent=self.writer_agent,
 #             context=[task1]
 #         )
 
 #         return Crew(
-#             agents=[research_agent, writer_agent],
+#             agents=[self.research_agent, self.writer_agent],
 #             tasks=[task1, task2],
 #             verbose=True
 #         )
 
+#     def _preprocess(self, message):
+#         """Lowercase and tokenize a message once for all the matchers"""
+#         msg_low = message.lower()
+#         return msg_low, set(WORD_RE.findall(msg_low))
+
 #     def get_fallback_response(self, message):
 #         """Get a fallback response when AI service is unavailable"""
-#         message = message.lower()
-        
-#         if any(greeting in message for greeting in self.response_patterns['greetings']):
+#         return self._fallback_response_pre(*self._preprocess(message))
+
+#     def _fallback_response_pre(self, msg_low, tokens):
+#         """get_fallback_response on an already lowercased and tokenized message"""
+#         canned = self._canned_response(msg_low, tokens)
+#         if canned is not None:
+#             return canned
+#         return "I'd love to help you upcycle your items! Could you tell me what materials you'd like to repurpose?"
+
+#     def _canned_response(self, msg_low, tokens):
+#         """Return the canned reply for greeting/identity/capability messages, or None"""
+#         if not self.response_patterns['greetings'].isdisjoint(tokens):
 #             return "Hi! I'm Wonder, your Waste2Wonder assistant. I'm here to help with waste management and upcycling!"
-#         elif any(word in message for word in self.response_patterns['identity']):
+#         elif self._identity_re.search(msg_low):
 #             return "I'm Wonder, the AI assistant for Waste2Wonder. I focus on helping with waste management and upcycling ideas!"
-#         elif any(word in message for word in self.response_patterns['capabilities']):
+#         elif self._capabilities_re.search(msg_low):
 #             return "I can help you with waste management tips, upcycling ideas, and sustainability advice. Just ask me anything about reducing waste or reusing materials!"
-#         return "I'd love to help you upcycle your items! Could you tell me what materials you'd like to repurpose?"
+#         return None
+
+#     def _exact_canned_response(self, msg_low, tokens):
+#         """Return the canned reply only if that is all the message asks for, or None"""
+#         if tokens and tokens <= self.response_patterns['greetings']:
+#             return self._canned_response(msg_low, tokens)
+#         if len(WORD_RE.findall(msg_low)) > CANNED_MAX_WORDS:
+#             return None
+#         # The intent has to appear as whole words, and apart from it the message
+#         # can't mention any upcycling intent or material ("help with old jars")
+#         rest = self._capabilities_word_re.sub(' ', self._identity_word_re.sub(' ', msg_low))
+#         if rest != msg_low and not self._query_re.search(rest):
+#             return self._canned_response(msg_low, tokens)
+#         return None
 
 #     def is_upcycling_query(self, message):
 #         """Determine if the message is asking for upcycling suggestions"""
-#         message = message.lower()
-        
-#         # Keywords that indicate upcycling intent
-#         upcycling_keywords = [
-#             'upcycling', 'upcycle', 'reuse', 'repurpose', 'make from', 'create with',
-#             'what can i do with', 'how to reuse', 'ideas for', 'craft from', 'tell me',
-#             'using', 'ideas', 'old', 'waste', 'recycle'
-#         ]
-        
-#         # Material keywords that often indicate upcycling queries
-#         material_keywords = [
-#             'plastic', 'paper', 'bottle', 'box', 'container', 'cardboard',
-#             'glass', 'metal', 'wood', 'cloth', 'fabric', 'materials'
-#         ]
-        
-#         # Check for upcycling intent
-#         has_upcycling_term = any(keyword in message for keyword in upcycling_keywords)
-#         has_material_term = any(keyword in message for keyword in material_keywords)
-        
+#         return self._is_upcycling_pre(message.lower())
+
+#     def _is_upcycling_pre(self, msg_low):
+#         """is_upcycling_query on an already lowercased message"""
 #         # If message contains both upcycling intent and mentions materials, it's likely an upcycling query
-#         return has_upcycling_term and has_material_term
+#         found = 0
+#         for match in self._query_re.finditer(msg_low):
+#             found |= 1 if match.lastgroup == 'up' else 2
+#             if found == 3:
+#                 return True
+#         return False
 
 #     def handle_message(self, message):
 #         """Process user message and return appropriate response"""
+#         msg_low, tokens = self._preprocess(message)
+#         return self._handle_message_pre(message, msg_low, tokens)
+
+#     def _handle_message_pre(self, message, msg_low, tokens):
+#         """handle_message with the lowercased message and its tokens precomputed"""
 #         try:
 #             # Log the message type for debugging
-#             is_upcycling = self.is_upcycling_query(message)
+#             is_upcycling = self._is_upcycling_pre(msg_low)
 #             logger.info(f"Message: '{message}' - Is upcycling query: {is_upcycling}")
             
-#             # For casual conversations, use Gemini directly
+#             # For casual conversations, answer bare greetings and the like with
+#             # the canned replies and use Gemini for everything else
 #             if not is_upcycling:
+#                 canned = self._exact_canned_response(msg_low, tokens)
+#                 if canned is not None:
+#                     return canned
+
 #                 response = self.llm.generate(f"""
 #                 You are Wonder, a friendly AI assistant for Waste2Wonder. 
 #                 Respond to this casual conversation: "{message}"
@@ -127,4 +193,4 @@
             
 #         except Exception as e:
 #             logger.warning(f"AI service error, using fallback: {str(e)}")
-#             return self.get_fallback_response(message)
\ No newline at end of file
+#             return self._fallback_response_pre(msg_low, tokens)
\ No newline at end of file
@@ -0,0 +1,10 @@
+import multiprocessing
+import os
+
+# Gunicorn settings for serving main:app outside Vercel: `gunicorn main:app`
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Tell the workers how many of them share the Groq rate limit (waste_analysis.py)
+raw_env = [f"WEB_CONCURRENCY={workers}"]
+worker_class = "gthread"
+threads = 8
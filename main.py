@@ -1,11 +1,20 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, session
 from flask_cors import CORS
+from flask_compress import Compress
 import cloudinary
 import cloudinary.uploader
 import os
+import asyncio
 from dotenv import load_dotenv
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import atexit
 import json
+import hashlib
+import threading
+import orjson
+from cachetools import LRUCache, TTLCache
 from supabase import create_client
 from waste_analysis import WasteAnalyzer
 # from chatbot import UpcyclingChatbot
@@ -14,13 +23,40 @@ from waste_analysis import WasteAnalyzer
 load_dotenv()
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+if os.getenv('VERCEL'):
+    # Serverless functions are frozen as soon as the response is sent, so
+    # records have to be written before then
+    logging.basicConfig(level=logging.INFO)
+else:
+    # Handlers only enqueue records; a listener thread does the actual writes
+    # so request threads and the analyzer loop never block on stderr
+    log_queue = queue.SimpleQueue()
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    log_listener = QueueListener(log_queue, log_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    logging.getLogger().addHandler(QueueHandler(log_queue))
+    logging.getLogger().setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
 
+def json_response(payload):
+    """Build a JSON response with orjson (drop-in for jsonify)"""
+    return app.response_class(orjson.dumps(payload), mimetype='application/json')
+
+# Compress JSON responses (brotli or gzip, per Accept-Encoding)
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_LEVEL'] = 4
+app.config['COMPRESS_BR_LEVEL'] = 4
+app.config['COMPRESS_MIN_SIZE'] = 1024
+# Streamed responses go out uncompressed so each chunk is sent as soon as it's ready
+app.config['COMPRESS_STREAMS'] = False
+Compress(app)
+
 # Configure CORS
 CORS(app, resources={
     r"/*": {
@@ -102,148 +138,218 @@ HARDCODED_SUGGESTIONS = [
     }
 ]
 
+# WasteAnalyzer is async; its calls run on one long-lived event loop so the
+# Groq client can keep its connections open between requests
+analyzer_loop = asyncio.new_event_loop()
+threading.Thread(target=analyzer_loop.run_forever, daemon=True).start()
+
+# Open the Groq connection in the background so the first user request
+# doesn't pay for the TLS handshake
+asyncio.run_coroutine_threadsafe(waste_analyzer.warmup(), analyzer_loop)
+
+def run_async(coro):
+    """Run a coroutine on the analyzer event loop and wait for the result"""
+    return asyncio.run_coroutine_threadsafe(coro, analyzer_loop).result()
+
+# Image types accepted by /api/upload-image
+ALLOWED_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Uploads above this size (bytes) go through Cloudinary's chunked upload API
+LARGE_UPLOAD_SIZE = 10 * 1024 * 1024
+
+# Cloudinary URLs of images already uploaded, keyed by a hash of the file
+# contents, so re-uploading the same image skips Cloudinary entirely
+uploaded_images = LRUCache(maxsize=4096)
+uploaded_images_lock = threading.Lock()
+
+# Short-lived cache of saved suggestions keyed by user ID. It is per-process
+# only; a user's entry is dropped whenever that user saves a new suggestion.
+suggestions_cache = TTLCache(maxsize=10_000, ttl=10)
+suggestions_cache_lock = threading.Lock()
+
 
 @app.route('/')
 def home():
-    return jsonify({"message": "Flask API is working successfully!"})
+    return json_response({"message": "Flask API is working successfully!"})
+
 
 
+def file_digest(stream, chunk_size=1024 * 1024):
+    """SHA-256 of a file stream's contents, leaving the stream at the start"""
+    sha = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        sha.update(chunk)
+    stream.seek(0)
+    return sha.hexdigest()
 
 # API Routes
 @app.route('/api/upload-image', methods=['POST'])
 def upload_image():
     """Upload image to Cloudinary"""
-    temp_path = None
-    
     try:
-        # Use /tmp directory on Vercel
-        temp_dir = '/tmp'
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-        
         # Validate image file
         if 'image' not in request.files:
-            return jsonify({"success": False, "error": "No image file provided"}), 400
+            return json_response({"success": False, "error": "No image file provided"}), 400
 
         file = request.files['image']
         if not file.filename:
-            return jsonify({"success": False, "error": "No file selected"}), 400
+            return json_response({"success": False, "error": "No file selected"}), 400
 
         # Validate file type
-        filename = file.filename.lower()
-        if not any(filename.endswith(ext) for ext in ['.png', '.jpg', '.jpeg']):
-            return jsonify({"success": False, "error": "Invalid file type. Allowed types: .png, .jpg, .jpeg"}), 400
-
-        # Save to temporary location
-        ext = os.path.splitext(filename)[1]
-        temp_path = os.path.join(temp_dir, f'temp_image{ext}')
-        file.save(temp_path)
-        
-        logger.info(f"Saved image temporarily: {temp_path}")
-
-        if not os.path.exists(temp_path) or os.path.getsize(temp_path) == 0:
-            return jsonify({"success": False, "error": "Invalid or empty image file"}), 400
-
-        # Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(temp_path)
+        if not file.filename.lower().endswith(ALLOWED_IMAGE_EXTENSIONS):
+            return json_response({"success": False, "error": "Invalid file type. Allowed types: .png, .jpg, .jpeg"}), 400
+
+        # Check the size on the request stream itself instead of saving a temp copy
+        stream = file.stream
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+
+        if size == 0:
+            return json_response({"success": False, "error": "Invalid or empty image file"}), 400
+
+        digest = file_digest(stream)
+        with uploaded_images_lock:
+            image_url = uploaded_images.get(digest)
+        if image_url:
+            logger.info(f"Image already uploaded: {image_url}")
+            return json_response({"success": True, "image_url": image_url})
+
+        # Upload to Cloudinary straight from the stream, chunked for large files
+        if size > LARGE_UPLOAD_SIZE:
+            upload_result = cloudinary.uploader.upload_large(stream, resource_type='image')
+        else:
+            upload_result = cloudinary.uploader.upload(stream, resource_type='image')
         image_url = upload_result.get('secure_url')
 
         if not image_url:
-            return jsonify({"success": False, "error": "Failed to get image URL from Cloudinary"}), 500
+            return json_response({"success": False, "error": "Failed to get image URL from Cloudinary"}), 500
 
+        with uploaded_images_lock:
+            uploaded_images[digest] = image_url
         logger.info(f"Uploaded to Cloudinary: {image_url}")
 
-        return jsonify({"success": True, "image_url": image_url})
+        return json_response({"success": True, "image_url": image_url})
 
     except Exception as e:
         logger.error(f"Error in image upload: {str(e)}")
-        return jsonify({"success": False, "error": f"Upload failed: {str(e)}"}), 500
+        return json_response({"success": False, "error": f"Upload failed: {str(e)}"}), 500
 
-    finally:
-        # Clean up temp file
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-                logger.info("Cleaned up temp file")
-            except Exception as e:
-                logger.warning(f"Failed to clean up temp file: {str(e)}")
 
+def read_suggestion_request():
+    """Validate a generate-suggestions request body.
+
+    Returns (suggestion_data, None) or (None, error_response).
+    """
+    # Get JSON data
+    data = request.json
+    if not data or 'formData' not in data:
+        return None, (json_response({
+            "success": False,
+            "error": "Invalid request format. formData is required."
+        }), 400)
+
+    form_data = data['formData']
+
+    # Validate required fields
+    if not form_data.get('description'):
+        return None, (json_response({
+            "success": False,
+            "error": "Description is required"
+        }), 400)
+
+    if not form_data.get('imageUrl'):
+        return None, (json_response({
+            "success": False,
+            "error": "Image URL is required"
+        }), 400)
+
+    suggestion_data = {
+        "description": form_data['description'],
+        "type": form_data['type'],
+        "category": form_data['category'],
+        "condition": form_data['condition'],
+        "quantity": form_data['quantity'],
+        "dimensions": form_data['dimensions'],
+        "weight": form_data['weight'],
+        "color": form_data['color'],
+        "material": form_data['material'],
+        "location": form_data['location'],
+        "image_url": form_data['imageUrl']
+    }
+    return suggestion_data, None
+
+def iter_async(agen):
+    """Iterate an async generator from sync code, one item at a time on the analyzer loop"""
+    async def next_item():
+        return await anext(agen, None)
+
+    try:
+        while (item := run_async(next_item())) is not None:
+            yield item
+    finally:
+        run_async(agen.aclose())
 
 @app.route('/api/generate-suggestions', methods=['POST'])
 def generate_suggestions():
     """Generate upcycling suggestions based on form data, including image analysis"""
     try:
-        # Get JSON data
-        data = request.json
-        if not data or 'formData' not in data:
-            return jsonify({
-                "success": False,
-                "error": "Invalid request format. formData is required."
-            }), 400
+        suggestion_data, error_response = read_suggestion_request()
+        if error_response:
+            return error_response
 
-        form_data = data['formData']
+        # Analyze the image, then generate suggestions with both analysis and form data
+        result = run_async(waste_analyzer.analyze_and_suggest(suggestion_data))
 
-        # Validate required fields
-        if not form_data.get('description'):
-            return jsonify({
-                "success": False,
-                "error": "Description is required"
-            }), 400
+        if not result["success"]:
+            return json_response(result), 400
 
-        if not form_data.get('imageUrl'):
-            return jsonify({
-                "success": False,
-                "error": "Image URL is required"
-            }), 400
+        return json_response({
+            "success": True,
+            "suggestions": result["suggestions"]
+        })
 
-        # First analyze the image
-        try:
-            analysis_result = waste_analyzer.analyze_image(form_data['imageUrl'])
-            if not analysis_result["success"]:
-                return jsonify({
-                    "success": False,
-                    "error": "Failed to analyze image"
-                }), 400
-            image_analysis = analysis_result["analysis"]
-        except Exception as e:
-            logger.error(f"Error analyzing image: {str(e)}")
-            return jsonify({
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"Error generating suggestions: {error_msg}")
+        return json_response({
+            "success": False,
+            "error": error_msg
+        }), 500
+
+@app.route('/api/generate-suggestions/stream', methods=['POST'])
+def generate_suggestions_stream():
+    """Stream suggestions as newline-delimited JSON while they are being generated"""
+    try:
+        suggestion_data, error_response = read_suggestion_request()
+        if error_response:
+            return error_response
+
+        analysis_result = run_async(waste_analyzer.analyze_image(suggestion_data['image_url']))
+        if not analysis_result["success"]:
+            return json_response({
                 "success": False,
                 "error": "Failed to analyze image"
-            }), 500
+            }), 400
 
-        # Generate suggestions with both analysis and form data
-        suggestion_data = {
-            "description": form_data['description'],
-            "type": form_data['type'],
-            "category": form_data['category'],
-            "condition": form_data['condition'],
-            "quantity": form_data['quantity'],
-            "dimensions": form_data['dimensions'],
-            "weight": form_data['weight'],
-            "color": form_data['color'],
-            "material": form_data['material'],
-            "location": form_data['location'],
-            "image_analysis": image_analysis,
-            "image_url": form_data['imageUrl']
-        }
-        
-        result = waste_analyzer.generate_suggestions(
-            analysis_data=suggestion_data
+        suggestions = waste_analyzer.generate_suggestions_stream(
+            {**suggestion_data, "image_analysis": analysis_result["analysis"]}
         )
 
-        if not result["success"]:
-            return jsonify(result), 400
+        def generate():
+            try:
+                for suggestion in iter_async(suggestions):
+                    yield orjson.dumps(suggestion) + b"\n"
+            except Exception as e:
+                logger.error(f"Error streaming suggestions: {str(e)}")
+                yield orjson.dumps({"success": False, "error": str(e)}) + b"\n"
 
-        return jsonify({
-            "success": True,
-            "suggestions": result["suggestions"]
-        })
+        return app.response_class(generate(), mimetype='application/x-ndjson')
 
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Error generating suggestions: {error_msg}")
-        return jsonify({
+        return json_response({
             "success": False,
             "error": error_msg
         }), 500
@@ -255,7 +361,7 @@ def get_suggestions():
         # Get the authorization header
         auth_header = request.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
+            return json_response({
                 "success": False,
                 "error": "Missing or invalid authorization token"
             }), 401
@@ -265,29 +371,36 @@ def get_suggestions():
         user_id = request.args.get('userId')
         
         if not user_id:
-            return jsonify({
+            return json_response({
                 "success": False,
                 "error": "User ID is required"
             }), 400
 
+        # Serve repeat polls from the cache
+        with suggestions_cache_lock:
+            cached = suggestions_cache.get(user_id)
+        if cached is not None:
+            return json_response({
+                "success": True,
+                "suggestions": cached
+            })
+
         # Query Supabase for saved suggestions
         try:
             result = supabase.table('saved_suggestions').select('*').eq('user_id', user_id).execute()
-            
-            if not result.data:
-                return jsonify({
-                    "success": True,
-                    "suggestions": []
-                })
+            suggestions = result.data or []
+
+            with suggestions_cache_lock:
+                suggestions_cache[user_id] = suggestions
 
-            return jsonify({
+            return json_response({
                 "success": True,
-                "suggestions": result.data
+                "suggestions": suggestions
             })
 
         except Exception as e:
             logger.error(f"Error fetching from Supabase: {str(e)}")
-            return jsonify({
+            return json_response({
                 "success": False,
                 "error": "Failed to fetch suggestions"
             }), 500
@@ -295,18 +408,41 @@ def get_suggestions():
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Error in get_suggestions: {error_msg}")
-        return jsonify({
+        return json_response({
             "success": False,
             "error": error_msg
         }), 500
 
+def bulk_insert(table, rows):
+    """Insert rows into a Supabase table in one PostgREST request, so a
+    batch is saved all-or-nothing"""
+    result = supabase.table(table).insert(rows).execute()
+    return result.data or []
+
+def to_saved_suggestion_row(user_id, suggestion):
+    """Map a frontend suggestion onto the saved_suggestions table columns"""
+    return {
+        'user_id': user_id,
+        'title': suggestion['title'],
+        'description': suggestion['description'],
+        'difficulty': suggestion['difficulty'],
+        'time_required': suggestion['timeRequired'],
+        'tools': suggestion['tools'],
+        'materials': suggestion['materials'],
+        'estimated_cost': suggestion['estimatedCost'],
+        'steps': suggestion['steps'],
+        'safety_tips': suggestion['safetyTips'],
+        'eco_impact': suggestion['ecoImpact'],
+        'video_search_query': suggestion['videoSearchQuery']
+    }
+
 @app.route('/api/save-suggestion', methods=['POST'])
 def save_suggestion():
     """Save a suggestion to user's collection"""
     try:
         data = request.json
         if not data or 'suggestion' not in data or 'userId' not in data:
-            return jsonify({
+            return json_response({
                 "success": False,
                 "error": "Missing required data"
             }), 400
@@ -314,7 +450,7 @@ def save_suggestion():
         # Get the authorization header
         auth_header = request.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({
+            return json_response({
                 "success": False,
                 "error": "Missing or invalid authorization token"
             }), 401
@@ -325,41 +461,44 @@ def save_suggestion():
         suggestion = data['suggestion']
         user_id = data['userId']
 
+        # A list of suggestions is saved with a single bulk insert
+        is_batch = isinstance(suggestion, list)
+        if is_batch and not suggestion:
+            return json_response({
+                "success": False,
+                "error": "Missing required data"
+            }), 400
+
         # Insert into Supabase with auth context
         try:
             # Convert the data to match our table structure
-            suggestion_data = {
-                'user_id': user_id,
-                'title': suggestion['title'],
-                'description': suggestion['description'],
-                'difficulty': suggestion['difficulty'],
-                'time_required': suggestion['timeRequired'],
-                'tools': suggestion['tools'],
-                'materials': suggestion['materials'],
-                'estimated_cost': suggestion['estimatedCost'],
-                'steps': suggestion['steps'],
-                'safety_tips': suggestion['safetyTips'],
-                'eco_impact': suggestion['ecoImpact'],
-                'video_search_query': suggestion['videoSearchQuery']
-            }
-
-            # Create a new Supabase client with the user's JWT
-            result = supabase.table('saved_suggestions').insert(suggestion_data).execute(
-                
-            )
+            suggestions = suggestion if is_batch else [suggestion]
+            rows = [to_saved_suggestion_row(user_id, s) for s in suggestions]
+
+            inserted = bulk_insert('saved_suggestions', rows)
             
-            if not result.data:
+            if not inserted:
                 raise Exception("Failed to insert data into Supabase")
 
-            return jsonify({
+            with suggestions_cache_lock:
+                suggestions_cache.pop(user_id, None)
+
+            if is_batch:
+                return json_response({
+                    "success": True,
+                    "message": "Suggestions saved successfully",
+                    "data": inserted
+                })
+
+            return json_response({
                 "success": True,
                 "message": "Suggestion saved successfully",
-                "data": result.data[0]
+                "data": inserted[0]
             })
 
         except Exception as e:
             logger.error(f"Error saving to Supabase: {str(e)}")
-            return jsonify({
+            return json_response({
                 "success": False,
                 "error": "Failed to save suggestion"
             }), 500
@@ -367,7 +506,7 @@ def save_suggestion():
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Error in save_suggestion: {error_msg}")
-        return jsonify({
+        return json_response({
             "success": False,
             "error": error_msg
         }), 500
@@ -383,12 +522,12 @@ def chat():
         data = request.json
         if not data or 'items' not in data:
             logger.warning("Invalid request: missing 'items' field")
-            return jsonify({'error': 'No message provided'}), 400
+            return json_response({'error': 'No message provided'}), 400
 
         user_message = data['items']
         if not isinstance(user_message, str):
             logger.warning("Invalid request: 'items' is not a string")
-            return jsonify({'error': 'Message must be a text string'}), 400
+            return json_response({'error': 'Message must be a text string'}), 400
 
         logger.info(f"Processing message: {user_message[:50]}...")  # Log first 50 chars
         
@@ -396,17 +535,17 @@ def chat():
             # Use the global chatbot instance
             response = chatbot.handle_message(user_message)
             logger.info("Successfully processed message")
-            return jsonify({'response': response})
+            return json_response({'response': response})
             
         except Exception as ai_error:
             logger.warning(f"AI service error: {str(ai_error)}")
             # Fall back to basic responses
             response = chatbot.get_fallback_response(user_message)
-            return jsonify({'response': response})
+            return json_response({'response': response})
             
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}")
-        return jsonify({
+        return json_response({
             'error': 'Sorry, I encountered a technical issue. Please try again in a moment.',
             'details': str(e) if os.getenv('DEBUG') == 'true' else None
         }), 500
@@ -1,50 +1,333 @@
-from groq import Groq
+from groq import AsyncGroq
+import asyncio
 import base64
+from functools import cached_property
+import logging
 import os
-from typing import List, Dict, Union
-import json
+import re
+import warnings
+import httpx
+from typing import Any, List, Dict, Union
+import ijson
+import msgspec
+from aiolimiter import AsyncLimiter
 from dotenv import load_dotenv
+from cache import LLMCache
 load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Vision model used for image analysis (and the fused analysis + suggestions call)
+VISION_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+
+# Text models for suggestions, cheapest first. Each is tried in turn until one
+# returns a complete, valid set of suggestions.
+SUGGESTIONS_MODELS = ("llama-3.1-8b-instant", "llama-3.3-70b-versatile")
+
+# Requests per minute the Groq account allows each model; calls are paced to
+# stay under it rather than hitting 429s and retrying. The limiters are per
+# process, so each gunicorn worker (WEB_CONCURRENCY, set by gunicorn.conf.py)
+# gets an equal share of the account budget.
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+GROQ_WORKER_REQUESTS_PER_MINUTE = max(1.0, GROQ_REQUESTS_PER_MINUTE / int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# Cloudinary delivery transformation applied to images sent to the vision
+# model: fit within 1024x1024 (never upscaled) as a quality-80 JPEG. Higher
+# resolutions cost more vision tokens without helping material recognition.
+VISION_IMAGE_TRANSFORMATION = "c_limit,w_1024,h_1024,q_80,f_jpg"
+
+ANALYSIS_PROMPT = "Please identify and describe:\n1. Main materials or objects in the image\n2. Their condition and colors\n3. Approximate size/dimensions\n4. Any unique features or characteristics\n5. Potential for upcycling"
+
+# JSON structure the models are asked to return suggestions in
+SUGGESTIONS_JSON_SCHEMA = '''{
+  "suggestions": [
+    {
+      "id": "1",
+      "title": "Project Title",
+      "description": "Brief description of the project",
+      "difficulty": "Easy/Medium/Hard",
+      "timeRequired": "X hours/minutes",
+      "tools": ["tool1", "tool2"],
+      "materials": ["material1", "material2"],
+      "estimatedCost": "$X",
+      "steps": ["step1", "step2", "step3"],
+      "safetyTips": ["tip1", "tip2"],
+      "ecoImpact": {
+        "co2Saved": 0.2,
+        "wasteReduced": 0.05,
+        "energySaved": 0.1
+      },
+      "videoSearchQuery": "Search query for tutorial video"
+    }
+  ]
+}'''
+
+# Leading number of an ecoImpact value the model wrote with units, e.g. "0.2 kg"
+LEADING_NUMBER_RE = re.compile(r"\s*(-?\d+(?:\.\d+)?)")
+
+def eco_number(value) -> float:
+    """Read an ecoImpact value as a float, defaulting to 0.0"""
+    if isinstance(value, str):
+        match = LEADING_NUMBER_RE.match(value)
+        return float(match.group(1)) if match else 0.0
+    return 0.0 if value is None else float(value)
+
+class EcoImpact(msgspec.Struct):
+    co2Saved: Union[float, str, None] = 0.0
+    wasteReduced: Union[float, str, None] = 0.0
+    energySaved: Union[float, str, None] = 0.0
+
+    def __post_init__(self):
+        self.co2Saved = eco_number(self.co2Saved)
+        self.wasteReduced = eco_number(self.wasteReduced)
+        self.energySaved = eco_number(self.energySaved)
+
+class Suggestion(msgspec.Struct):
+    """One upcycling project; fields the model leaves out get their defaults"""
+    id: Union[str, int] = ""
+    title: str = ""
+    description: str = ""
+    difficulty: str = ""
+    timeRequired: str = ""
+    tools: List[str] = []
+    materials: List[str] = []
+    estimatedCost: Union[str, int, float] = ""
+    steps: List[str] = []
+    safetyTips: List[str] = []
+    ecoImpact: Union[EcoImpact, str, None] = msgspec.field(default_factory=EcoImpact)
+    videoSearchQuery: str = ""
+
+    def __post_init__(self):
+        self.id = str(self.id)
+        # A null or free-text ecoImpact gets the zero estimates
+        if not isinstance(self.ecoImpact, EcoImpact):
+            self.ecoImpact = EcoImpact()
+
+class SuggestionsResponse(msgspec.Struct):
+    suggestions: List[Suggestion]
+
+class FusedResponse(SuggestionsResponse):
+    # Models often return the 5-point analysis as an object rather than text
+    image_analysis: Any = ""
+
+    def __post_init__(self):
+        if self.image_analysis is None:
+            self.image_analysis = ""
+        elif not isinstance(self.image_analysis, str):
+            self.image_analysis = msgspec.json.encode(self.image_analysis).decode()
+
+def vision_image_url(image_url: str) -> str:
+    """URL of the downscaled rendition of a Cloudinary image for the vision model"""
+    if "res.cloudinary.com/" not in image_url or "/upload/" not in image_url:
+        return image_url
+    return image_url.replace("/upload/", f"/upload/{VISION_IMAGE_TRANSFORMATION}/", 1)
+
+# Static instructions + schema, sent as the system message of every suggestions
+# call so the identical prefix can be reused by the provider across requests
+SUGGESTIONS_SYSTEM_PROMPT = f'''You suggest practical upcycling projects for waste items.
+
+Generate EXACTLY 3 practical upcycling project suggestions. Return ONLY VALID JSON following this structure:
+
+{SUGGESTIONS_JSON_SCHEMA}
+
+Ensure the suggestions are practical, match the material type and condition, and include realistic environmental impact estimates.'''
+
+# Optional form fields, filled in when the request leaves them out
+ITEM_DETAIL_DEFAULTS = {
+    "dimensions": "Not specified",
+    "weight": "Not specified",
+    "color": "Not specified",
+    "material": "Not specified",
+    "location": "Not specified"
+}
+
+# Per-item form details
+ITEM_DETAILS_TEMPLATE = '''Item Description: {description}
+Type: {type}
+Category: {category}
+Condition: {condition}
+Quantity: {quantity}
+Additional Details:
+- Dimensions: {dimensions}
+- Weight: {weight}
+- Color: {color}
+- Material: {material}
+- Location: {location}'''
+
+SUGGESTIONS_PROMPT_TEMPLATE = f'''Based on this waste item analysis:
+{{image_analysis}}
+
+{ITEM_DETAILS_TEMPLATE}'''
+
+FUSED_PROMPT_TEMPLATE = f'''{ANALYSIS_PROMPT}
+
+Then use your analysis of the image together with these details of the waste item:
+{ITEM_DETAILS_TEMPLATE}
+
+Include your description of the image as an "image_analysis" string in the JSON object, alongside "suggestions".'''
+
+# Everything up to the next brace, skipping over complete JSON string
+# literals, then that brace. A quote in the group means an unterminated string.
+NEXT_BRACE_RE = re.compile(r'[^"{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}]*)*([{}"])', re.DOTALL)
+
+def sanitize_response(response_text: str) -> str:
+    """Sanitize the response text to ensure it is valid JSON"""
+    # Return the first balanced {...} object, skipping any text around it.
+    # Each regex match jumps straight to the next brace outside a string, so
+    # the Python loop only runs once per brace.
+    start_idx = response_text.find('{')
+    if start_idx == -1:
+        return response_text
+    depth = 0
+    pos = start_idx
+    while True:
+        match = NEXT_BRACE_RE.match(response_text, pos)
+        if match is None or match.group(1) == '"':
+            return response_text
+        pos = match.end()
+        if match.group(1) == '{':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return response_text[start_idx:pos]
+
 class WasteAnalyzer:
     def __init__(self):
-        """Initialize WasteAnalyzer with Groq client"""
+        """Initialize WasteAnalyzer with an async Groq client"""
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY is not set in the environment variables.")
-        self.client = Groq(api_key=api_key)
+        self._api_key = api_key
+        # Groq rate limits are per model, so each model gets its own limiter
+        self.limiters: Dict[str, AsyncLimiter] = {}
+        # Exact-match cache of image analyses and generated suggestions
+        self.cache = LLMCache(maxsize=1024, ttl=3600)
+        self._warmed = False
         
+    @cached_property
+    def http_client(self) -> httpx.AsyncClient:
+        """One pooled HTTP/2 client, so concurrent calls share a connection
+        to the Groq API instead of each paying for a TLS handshake"""
+        return httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        )
+
+    @cached_property
+    def client(self) -> AsyncGroq:
+        """Groq client, built on first use rather than at startup"""
+        return AsyncGroq(api_key=self._api_key, http_client=self.http_client)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections, if any were opened"""
+        if "http_client" in self.__dict__:
+            await self.http_client.aclose()
+
+    async def warmup(self) -> None:
+        """Open the pooled connection to the Groq API ahead of the first request"""
+        if self._warmed:
+            return
+        self._warmed = True
+        try:
+            # Every model is served from the same host, so one cheap call
+            # leaves an HTTP/2 connection open for all of them
+            await self.client.models.list()
+        except Exception as e:
+            logger.warning(f"Groq warm-up failed: {str(e)}")
+
+    async def _create_completion(self, **kwargs):
+        """Create a chat completion, waiting for the model's rate limiter first"""
+        model = kwargs["model"]
+        if model not in self.limiters:
+            self.limiters[model] = AsyncLimiter(GROQ_WORKER_REQUESTS_PER_MINUTE, 60)
+        async with self.limiters[model]:
+            return await self.client.chat.completions.create(**kwargs)
+
     def encode_image(self, image_file) -> str:
-        """Encode the uploaded file to base64"""
+        """Encode the uploaded file to base64.
+
+        Deprecated: upload the image and pass its URL to the model instead of
+        inlining it; base64 makes the request a third larger.
+        """
+        warnings.warn(
+            "encode_image is deprecated; upload the image and pass its URL instead",
+            DeprecationWarning,
+            stacklevel=2
+        )
         try:
-            image_file.seek(0)  # Reset file pointer
-            encoded = base64.b64encode(image_file.read()).decode("utf-8")
-            image_file.seek(0)  # Reset for future use
-            return encoded
+            # Read the file once; repeat calls reuse the bytes kept on it
+            data = getattr(image_file, "_cached_bytes", None)
+            if data is None:
+                image_file.seek(0)  # Reset file pointer
+                data = image_file.read()
+                image_file.seek(0)  # Reset for future use
+                try:
+                    image_file._cached_bytes = data
+                except AttributeError:
+                    pass  # File object doesn't take attributes; just don't cache
+            return base64.b64encode(data).decode("ascii")
         except Exception as e:
-            print(f"Error encoding image: {str(e)}")
+            logger.error(f"Error encoding image: {str(e)}")
             return ""
 
-    def analyze_image(self, image_url) -> dict:
+    def _prompt_fields(self, analysis_data: dict) -> dict:
+        """Template fields for an item, with the optional details defaulted"""
+        return {**ITEM_DETAIL_DEFAULTS, **analysis_data}
+
+    def _parse_suggestions(self, response_text: str, response_type=SuggestionsResponse):
+        """Decode and validate the suggestions JSON in a model response"""
+        # JSON mode responses decode directly; only fall back to extracting the
+        # object from surrounding text if the model wrapped it anyway
+        try:
+            return msgspec.json.decode(response_text, type=response_type, strict=False)
+        except msgspec.ValidationError:
+            raise
+        except msgspec.DecodeError:
+            return msgspec.json.decode(sanitize_response(response_text), type=response_type, strict=False)
+
+    def _suggestions_messages(self, analysis_data: dict) -> List[Dict]:
+        """Build the suggestions chat messages from the image analysis and form data"""
+        return [
+            {"role": "system", "content": SUGGESTIONS_SYSTEM_PROMPT},
+            {"role": "user", "content": SUGGESTIONS_PROMPT_TEMPLATE.format_map(self._prompt_fields(analysis_data))}
+        ]
+
+    async def analyze_image(self, image_url) -> dict:
         """Get material analysis from image using Groq's image recognition"""
         if not image_url:
-            print("No image URL provided")
+            logger.warning("No image URL provided")
             return {"success": False, "error": "No image URL provided"}
-            
+
+        # Cloudinary URLs are versioned, so a URL always names the same image
+        # and its analysis can be reused without re-checking the file
+        cache_key = LLMCache.make_key("analysis", image_url)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             # Make API call for material analysis using URL directly
-            response = self.client.chat.completions.create(
-                model="meta-llama/llama-4-scout-17b-16e-instruct",
+            response = await self._create_completion(
+                model=VISION_MODEL,
                 messages=[{
                     "role": "user",
                     "content": [
                         {
                             "type": "text",
-                            "text": "Please identify and describe:\n1. Main materials or objects in the image\n2. Their condition and colors\n3. Approximate size/dimensions\n4. Any unique features or characteristics\n5. Potential for upcycling"
+                            "text": ANALYSIS_PROMPT
                         },
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": image_url
+                                "url": vision_image_url(image_url)
                             }
                         }
                     ]
@@ -53,189 +336,217 @@ class WasteAnalyzer:
                 max_tokens=500
             )
             
-            return {
+            result = {
                 "success": True, 
                 "analysis": response.choices[0].message.content
             }
+            self.cache.set(cache_key, result)
+            return result
             
         except Exception as e:
             error_msg = str(e)
-            print(f"Error analyzing image: {error_msg}")
+            logger.error(f"Error analyzing image: {error_msg}")
             return {"success": False, "error": error_msg}
 
-    def generate_suggestions(self, analysis_data: dict) -> dict:
+    async def generate_suggestions(self, analysis_data: dict) -> dict:
         """Generate upcycling suggestions based on image analysis and form data"""
+        cache_key = LLMCache.make_key("suggestions", analysis_data)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
-            # Create comprehensive prompt for project suggestions
-            prompt = f'''
-Based on this waste item analysis:
-{analysis_data['image_analysis']}
-
-Item Description: {analysis_data['description']}
-Type: {analysis_data['type']}
-Category: {analysis_data['category']}
-Condition: {analysis_data['condition']}
-Quantity: {analysis_data['quantity']}
-Additional Details:
-- Dimensions: {analysis_data.get('dimensions', 'Not specified')}
-- Weight: {analysis_data.get('weight', 'Not specified')}
-- Color: {analysis_data.get('color', 'Not specified')}
-- Material: {analysis_data.get('material', 'Not specified')}
-- Location: {analysis_data.get('location', 'Not specified')}
+            messages = self._suggestions_messages(analysis_data)
+            error_msg = "Failed to generate valid suggestions"
+            for model in SUGGESTIONS_MODELS:
+                try:
+                    response_text = await self._generate_with(model, messages)
+                except Exception as e:
+                    # API errors (JSON mode validation, 429, 5xx) escalate too
+                    error_msg = str(e)
+                    logger.warning(f"Error generating suggestions with {model}: {error_msg}")
+                    continue
 
-Generate EXACTLY 3 practical upcycling project suggestions. Return them in VALID JSON format following this structure:
+                try:
+                    suggestions_data = self._parse_suggestions(response_text)
+                except msgspec.DecodeError:
+                    logger.warning(f"Failed to parse JSON from {model} response: {response_text}")
+                    error_msg = "Failed to generate valid suggestions"
+                    continue
 
-{{
-  "suggestions": [
-    {{
-      "id": "1",
-      "title": "Project Title",
-      "description": "Brief description of the project",
-      "difficulty": "Easy/Medium/Hard",
-      "timeRequired": "X hours/minutes",
-      "tools": ["tool1", "tool2"],
-      "materials": ["material1", "material2"],
-      "estimatedCost": "$X",
-      "steps": ["step1", "step2", "step3"],
-      "safetyTips": ["tip1", "tip2"],
-      "ecoImpact": {{
-        "co2Saved": 0.2,
-        "wasteReduced": 0.05,
-        "energySaved": 0.1
-      }},
-      "videoSearchQuery": "Search query for tutorial video"
-    }}
-  ]
-}}
+                if not self._is_complete(suggestions_data):
+                    logger.info(f"Incomplete suggestions from {model}")
+                    continue
+
+                result = {
+                    "success": True,
+                    "suggestions": msgspec.to_builtins(suggestions_data.suggestions)
+                }
+                self.cache.set(cache_key, result)
+                return result
+
+            return {
+                "success": False,
+                "error": error_msg
+            }
+
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"Error generating suggestions: {error_msg}")
+            return {"success": False, "error": error_msg}
+
+    async def _generate_with(self, model: str, messages: List[Dict]) -> str:
+        """Request suggestions JSON from one model and return the response text"""
+        chat_completion = await self._create_completion(
+            messages=messages,
+            model=model,
+            temperature=0.7,
+            max_tokens=1200,
+            response_format={"type": "json_object"}
+        )
+        return chat_completion.choices[0].message.content
+
+    def _is_complete(self, suggestions_data: SuggestionsResponse) -> bool:
+        """Whether a response has all 3 suggestions, each with a title and steps"""
+        return len(suggestions_data.suggestions) >= 3 and all(
+            suggestion.title and suggestion.steps for suggestion in suggestions_data.suggestions
+        )
 
-Ensure the suggestions are practical, match the material type and condition, and include realistic environmental impact estimates.
+    async def generate_suggestions_stream(self, analysis_data: dict):
+        """Yield each suggestion as soon as the model has finished generating it"""
+        stream = await self._create_completion(
+            messages=self._suggestions_messages(analysis_data),
+            model=SUGGESTIONS_MODELS[-1],
+            temperature=0.7,
+            max_tokens=1200,
+            stream=True
+        )
 
-🪴 Description:
-{{Short description of the finished product.}}
+        # Incrementally parse the JSON as it arrives, building each complete
+        # entry of the "suggestions" array from the parser events
+        events = ijson.sendable_list()
+        parser = ijson.parse_coro(events, use_float=True)
+        builder = None
+        started = False
+        finished = False
 
-⏱️ Time Estimate: X-Y hours
+        try:
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if not text:
+                    continue
 
-🧰 Required Tools (count tools and list):
-- Tool 1
-- Tool 2
+                if not started:
+                    # Skip any text the model writes before the JSON object
+                    start_idx = text.find('{')
+                    if start_idx == -1:
+                        continue
+                    text = text[start_idx:]
+                    started = True
 
-🧱 Materials:
-- Material 1
-- Material 2
+                parse_error = None
+                try:
+                    parser.send(text.encode("utf-8"))
+                except ijson.JSONError as e:
+                    parse_error = e
 
-💵 Estimated Cost: $X-Y
+                for prefix, event, value in events:
+                    if prefix == 'suggestions.item' and event in ('start_map', 'start_array'):
+                        builder = ijson.ObjectBuilder()
+                    if builder is not None:
+                        builder.event(event, value)
+                        if prefix == 'suggestions.item' and event in ('end_map', 'end_array'):
+                            yield msgspec.to_builtins(msgspec.convert(builder.value, Suggestion, strict=False))
+                            builder = None
+                    if prefix == '' and event == 'end_map':
+                        finished = True
+                del events[:]
 
-📋 Steps:
-1. Step one...
-2. Step two...
-...
-(10 steps max)
+                if finished:
+                    # Anything after the JSON object is trailing text
+                    break
+                if parse_error is not None:
+                    raise parse_error
+        finally:
+            await stream.close()
 
-⚠️ Safety Tips:
-- Tip 1
-- Tip 2
+        if not finished:
+            raise ValueError("Suggestions stream ended before the JSON object was complete")
 
-🌱 Environmental Impact:
-- CO2 Saved: X.X kg
-- Waste Reduced: X.X kg
-- Energy Saved: X.X kWh
----
+    async def analyze_and_suggest_fused(self, item: dict) -> dict:
+        """Analyze an item's image and generate suggestions in a single vision model call"""
+        if not item.get("image_url"):
+            return {"success": False, "error": "No image URL provided"}
 
-Please provide two unique project ideas following this EXACT format.
-Ensure projects are practical and match the available materials.
-'''
+        prompt = FUSED_PROMPT_TEMPLATE.format_map(self._prompt_fields(item))
 
-            # Generate suggestions using a different model optimized for creative text
-            # Generate creative suggestions
-            chat_completion = self.client.chat.completions.create(
+        try:
+            response = await self._create_completion(
+                model=VISION_MODEL,
                 messages=[{
+                    "role": "system",
+                    "content": SUGGESTIONS_SYSTEM_PROMPT
+                }, {
                     "role": "user",
-                    "content": prompt
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": vision_image_url(item["image_url"])
+                            }
+                        }
+                    ]
                 }],
-                model="llama-3.3-70b-versatile",  # Model better suited for creative text generation
                 temperature=0.7,
-                max_tokens=2000
+                max_tokens=1700,
+                response_format={"type": "json_object"}
             )
 
-            # Get the response
-            response_text = chat_completion.choices[0].message.content
-
-            response_text = sanitize_response(response_text)
-
-            try:
-                # Parse JSON from response
-                suggestions_data = json.loads(response_text)
-                
-                # Validate structure
-                if not isinstance(suggestions_data, dict) or 'suggestions' not in suggestions_data:
-                    raise ValueError("Invalid response format")
-                
-                # Ensure each suggestion has required fields
-                for suggestion in suggestions_data['suggestions']:
-                    required_fields = [
-                        'id', 'title', 'description', 'difficulty', 'timeRequired',
-                        'tools', 'materials', 'estimatedCost', 'steps', 'safetyTips',
-                        'ecoImpact', 'videoSearchQuery'
-                    ]
-                    for field in required_fields:
-                        if field not in suggestion:
-                            suggestion[field] = '' if field in ['id', 'title', 'description', 'difficulty', 
-                                                              'timeRequired', 'estimatedCost', 'videoSearchQuery'] else []
-                    
-                    if 'ecoImpact' not in suggestion or not isinstance(suggestion['ecoImpact'], dict):
-                        suggestion['ecoImpact'] = {
-                            'co2Saved': 0.0,
-                            'wasteReduced': 0.0,
-                            'energySaved': 0.0
-                        }
+            suggestions_data = self._parse_suggestions(response.choices[0].message.content, FusedResponse)
+            if not self._is_complete(suggestions_data):
+                # Let analyze_and_suggest fall back to the two-step path
+                logger.info(f"Incomplete suggestions from {VISION_MODEL}")
+                return {"success": False, "error": "Incomplete suggestions"}
+
+            return {
+                "success": True,
+                "analysis": suggestions_data.image_analysis,
+                "suggestions": msgspec.to_builtins(suggestions_data.suggestions)
+            }
 
-                return {
-                    "success": True,
-                    "suggestions": suggestions_data['suggestions']
-                }
-                
-            except json.JSONDecodeError:
-                print(f"Failed to parse JSON from response: {response_text}")
-                return {
-                    "success": False,
-                    "error": "Failed to generate valid suggestions"
-                }
-            
         except Exception as e:
             error_msg = str(e)
-            print(f"Error generating suggestions: {error_msg}")
+            logger.warning(f"Error in fused analysis: {error_msg}")
             return {"success": False, "error": error_msg}
 
-if __name__ == "__main__":
-    # Test data
-    analyzer = WasteAnalyzer()
-    test_data = {
-        "description": "Old plastic bottle",
-        "imageUrl": "https://example.com/image.jpg",
-        "type": "Plastic bottle",
-        "category": "Plastic",
-        "condition": "Good",
-        "quantity": 1,
-        "dimensions": "20cm x 10cm",
-        "weight": "50g",
-        "color": "Clear",
-        "material": "PET plastic",
-        "location": "New York"
-    }
-    
-    # Test analysis and suggestions
-    analysis = analyzer.analyze_image(test_data["imageUrl"])
-    if analysis["success"]:
-        test_data["image_analysis"] = analysis["analysis"]
-        suggestions = analyzer.generate_suggestions(test_data)
-        print("\nSuggestions:", json.dumps(suggestions, indent=2))
+    async def analyze_and_suggest(self, item: dict) -> dict:
+        """Generate suggestions for an item, with one fused model call when possible"""
+        # The same image URL and form details get the cached suggestions
+        cache_key = LLMCache.make_key("item", item)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
 
+        result = await self.analyze_and_suggest_fused(item)
+        if not result["success"]:
+            # Fall back to the two-step analyze -> suggest path
+            analysis = await self.analyze_image(item.get("image_url"))
+            if not analysis["success"]:
+                return {"success": False, "error": "Failed to analyze image"}
 
-def sanitize_response(response_text: str) -> str:
-    """Sanitize the response text to ensure it is valid JSON"""
-    # Remove any leading/trailing text before/after the JSON object
-    start_idx = response_text.find('{')
-    end_idx = response_text.rfind('}') + 1
-    if start_idx != -1 and end_idx != -1:
-        return response_text[start_idx:end_idx]
-    return response_text
\ No newline at end of file
+            result = await self.generate_suggestions({**item, "image_analysis": analysis["analysis"]})
+
+        if result["success"]:
+            self.cache.set(cache_key, result)
+        return result
+
+    async def run_batch(self, items: List[dict]) -> list:
+        """Run analyze_and_suggest for several items concurrently"""
+        return await asyncio.gather(
+            *(self.analyze_and_suggest(item) for item in items),
+            return_exceptions=True
+        )